@@ -1,68 +1,92 @@
+import logging
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from dotenv import load_dotenv
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
 
-# Load environment variables
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-def get_connection():
-    """Create and return a database connection"""
-    try:
-        conn = psycopg2.connect(
+# Shared async connection pool, opened by init_db()
+_pool = None
+
+async def init_db():
+    """Open the database connection pool and ensure the schema exists"""
+    global _pool
+    if _pool is None:
+        _pool = AsyncConnectionPool(
             os.getenv("DATABASE_URL"),
-            cursor_factory=RealDictCursor  # Return results as dictionaries
+            min_size=2,
+            max_size=20,
+            kwargs={
+                "sslmode": "require",
+                "autocommit": True,  # Reads skip BEGIN/COMMIT; writes open explicit transactions
+                "row_factory": dict_row  # Return results as dictionaries
+            },
+            open=False
         )
-        return conn
-    except Exception as e:
-        print(f"Database connection failed: {e}")
-        return None
+        await _pool.open()
+        await _create_tables()
 
-def save_user_interests(user_id, username, interests):
-    """Save user interests and username to database"""
-    conn = get_connection()
-    if conn is None:
-        print("Database connection failed")
-        return False
+async def _create_tables():
+    """Create the users table and its indexes if they do not exist"""
+    async with _pool.connection() as conn, conn.transaction():
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                user_id VARCHAR PRIMARY KEY,
+                username TEXT,
+                interests TEXT[]
+            );
+        """)
+        # GIN with explicit array_ops backs the && overlap filter in find_matching_users
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_interests
+            ON users USING GIN (interests array_ops);
+        """)
+
+async def close_db():
+    """Close the database connection pool"""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
 
+async def save_user_interests(user_id, username, interests):
+    """Save user interests and username to database"""
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO users (user_id, username, interests)
-            VALUES (%s, %s, %s)
-            ON CONFLICT (user_id) 
-            DO UPDATE SET 
-                username = EXCLUDED.username,
-                interests = EXCLUDED.interests;
-        """, (str(user_id), username, interests))
-        conn.commit()
-        print(f"Successfully saved interests for user {username}: {interests}")
+        async with _pool.connection() as conn, conn.transaction():
+            await conn.execute("""
+                INSERT INTO users (user_id, username, interests)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (user_id) 
+                DO UPDATE SET 
+                    username = EXCLUDED.username,
+                    interests = EXCLUDED.interests;
+            """, (str(user_id), username, interests), prepare=True)
+        logger.info("Saved interests for user %s: %s", username, interests)
         return True
     except Exception as e:
-        print(f"Failed to save user interests: {e}")
+        logger.warning("Failed to save user interests for user %s", user_id, exc_info=e)
         return False
-    finally:
-        conn.close()
-
-def find_matching_users(user_id, interests):
-    """Find other users with matching interests"""
-    conn = get_connection()
-    if conn is None:
-        return []
 
+async def find_matching_users(user_id, interests, limit=10):
+    """Find other users with matching interests, best overlap first"""
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT username, interests 
-            FROM users 
-            WHERE user_id != %s::varchar 
-            AND interests && %s::text[];
-        """, (str(user_id), interests))
-        matches = cursor.fetchall()
-        print(f"Found matching users: {matches}")
+        async with _pool.connection() as conn:
+            cursor = await conn.execute("""
+                SELECT username, interests,
+                    cardinality(ARRAY(
+                        SELECT unnest(interests)
+                        INTERSECT
+                        SELECT unnest(%(interests)s::text[])
+                    )) AS overlap
+                FROM users 
+                WHERE user_id != %(user_id)s::varchar 
+                AND interests && %(interests)s::text[]
+                ORDER BY overlap DESC, user_id
+                LIMIT %(limit)s;
+            """, {"user_id": str(user_id), "interests": interests, "limit": limit}, prepare=True)
+            matches = await cursor.fetchall()
+        logger.info("Found %d matching users for user %s", len(matches), user_id)
         return matches
     except Exception as e:
-        print(f"Failed to match users: {e}")
-        return []
-    finally:
-        conn.close()
\ No newline at end of file
+        logger.warning("Failed to match users for user %s", user_id, exc_info=e)
+        return []
\ No newline at end of file
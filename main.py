@@ -1,17 +1,162 @@
+from telegram.constants import MessageLimit
 from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters
-from database import save_user_interests, find_matching_users
+from database import init_db, close_db, save_user_interests, find_matching_users
+import asyncio
+import hashlib
+import json
+import logging
 import os
-from openai import OpenAI
+import sys
+from collections import OrderedDict
+import httpx
+import redis.asyncio as aioredis
+from aiolimiter import AsyncLimiter
+from openai import AsyncOpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI client
-client = OpenAI(
-    api_key="sk-13DJKXp6QBphm8MaRbUwOiwRmx9E2qwW6lf9dMP30eEeqyXJ",
-    base_url="https://api.deerapi.com/v1"
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+logging.getLogger("httpx").setLevel(logging.WARNING)  # Don't log every Telegram/OpenAI request
+logger = logging.getLogger(__name__)
+
+# OpenAI client, created on first use so all requests share one HTTP/2 connection pool
+_openai_client = None
+
+def _get_client():
+    """Return the shared OpenAI client, creating it if needed"""
+    global _openai_client
+    if _openai_client is None:
+        _openai_client = AsyncOpenAI(
+            api_key=os.environ["OPENAI_API_KEY"],
+            base_url=os.getenv("OPENAI_BASE_URL", "https://api.deerapi.com/v1"),
+            max_retries=0,  # Retries are handled by _llm so each attempt passes the rate limiter
+            http_client=httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=64, max_connections=128),
+                timeout=30
+            )
+        )
+    return _openai_client
+
+# Cap the number of in-flight OpenAI requests across concurrent updates
+_openai_sem = asyncio.Semaphore(8)
+
+# Keep the request rate under the API quota (requests per minute)
+_llm_limiter = AsyncLimiter(240, 60)
+
+_llm_backoff = wait_exponential(multiplier=1, max=30)
+
+def _llm_wait(retry_state):
+    """Honour Retry-After on 429s, otherwise back off exponentially"""
+    exc = retry_state.outcome.exception()
+    if isinstance(exc, RateLimitError):
+        try:
+            return min(float(exc.response.headers.get("retry-after")), 60)
+        except (TypeError, ValueError):
+            pass
+    return _llm_backoff(retry_state)
+
+# Same transient failures the OpenAI SDK retries by default (max_retries is 0 on our client)
+@retry(
+    retry=retry_if_exception_type((RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)),
+    wait=_llm_wait,
+    stop=stop_after_attempt(5),
+    reraise=True
 )
+async def _llm(**kwargs):
+    """Send a chat completion request through the concurrency and rate limits"""
+    async with _openai_sem, _llm_limiter:
+        return await _get_client().chat.completions.create(**kwargs)
+
+# Recently extracted interests keyed by normalized message text (LRU)
+_interest_memo = OrderedDict()
+_INTEREST_MEMO_SIZE = 10000
+
+# Shared cache for extraction results across restarts; disabled when REDIS_URL is unset.
+# Short timeouts make a slow or unreachable Redis count as a miss instead of stalling messages.
+_redis = aioredis.Redis.from_url(
+    os.getenv("REDIS_URL"),
+    socket_timeout=1,
+    socket_connect_timeout=1
+) if os.getenv("REDIS_URL") else None
+_INTEREST_CACHE_TTL = 4 * 60 * 60  # seconds
+
+def _remember_interests(key, interests):
+    """Store extracted interests in the in-process LRU"""
+    _interest_memo[key] = interests
+    if len(_interest_memo) > _INTEREST_MEMO_SIZE:
+        _interest_memo.popitem(last=False)
+
+async def _cache_get(key):
+    """Read a value from Redis, treating any failure as a miss"""
+    if _redis is None:
+        return None
+    try:
+        return await _redis.get(key)
+    except Exception as e:
+        logger.warning("Redis read failed for %s", key, exc_info=e)
+        return None
+
+async def _cache_set(key, value, ttl):
+    """Write a value to Redis with a TTL, ignoring failures"""
+    if _redis is None:
+        return
+    try:
+        await _redis.setex(key, ttl, value)
+    except Exception as e:
+        logger.warning("Redis write failed for %s", key, exc_info=e)
+
+async def extract_interests(user_input):
+    """Call ChatGPT to extract interest keywords from a user message"""
+    key = " ".join(user_input.lower().split())
+    if key in _interest_memo:
+        _interest_memo.move_to_end(key)
+        return list(_interest_memo[key])
+
+    redis_key = "interests:" + hashlib.sha256(key.encode()).hexdigest()
+    cached = await _cache_get(redis_key)
+    if cached is not None:
+        try:
+            interests = json.loads(cached)
+        except ValueError as e:
+            logger.warning("Ignoring unreadable cached interests for %s", redis_key, exc_info=e)
+        else:
+            _remember_interests(key, interests)
+            return list(interests)
+
+    response = await _llm(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": "You are an interest extraction assistant. Extract game-related interest keywords from user messages, separated by commas."},
+            {"role": "user", "content": f"Extract interest keywords: {user_input}"}
+        ]
+    )
+    raw_interests = response.choices[0].message.content.strip()
+    interests = [x.strip() for x in raw_interests.split(",") if x.strip()]
+
+    if interests:
+        _remember_interests(key, interests)
+        await _cache_set(redis_key, json.dumps(interests, ensure_ascii=False), _INTEREST_CACHE_TTL)
+    return list(interests)
+
+def _fit_message(header, lines):
+    """Append as many whole lines to header as fit in one Telegram message"""
+    # Telegram measures message length in UTF-16 code units
+    def utf16_len(s):
+        return len(s.encode("utf-16-le")) // 2
+
+    text = header
+    length = utf16_len(header)
+    for line in lines:
+        line_length = 1 + utf16_len(line)
+        if length + line_length > MessageLimit.MAX_TEXT_LENGTH:
+            continue
+        text += "\n" + line
+        length += line_length
+    return text
 
 async def start(update, context):
     """Handle the /start command"""
@@ -28,49 +173,66 @@ async def handle_message(update, context):
 
     # Call ChatGPT to extract interest keywords
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are an interest extraction assistant. Extract game-related interest keywords from user messages, separated by commas."},
-                {"role": "user", "content": f"Extract interest keywords: {user_input}"}
-            ]
-        )
-        raw_interests = response.choices[0].message.content.strip()
-        interests = [x.strip() for x in raw_interests.split(",") if x.strip()]
+        interests = await extract_interests(user_input)
         
         if not interests:
             await update.message.reply_text("No interest keywords detected. Please try again.")
             return
 
     except Exception as e:
-        print(f"ChatGPT API call failed: {e}")
+        logger.warning("ChatGPT API call failed for user %s", user_id, exc_info=e)
         await update.message.reply_text("Service temporarily unavailable. Please try again later.")
         return
 
     # Save user interests to database
-    if save_user_interests(user_id, username, interests):
+    if await save_user_interests(user_id, username, interests):
         await update.message.reply_text(f"Your interests have been recorded: {', '.join(interests)}! Searching for matching players...")
-        matches = find_matching_users(user_id, interests)
+        matches = await find_matching_users(user_id, interests)
         if matches:
-            match_list = "\n".join(
-                [f"User {user['username']} (Interests: {', '.join(user['interests'])})" 
-                 for user in matches]
-            )
-            await update.message.reply_text(f"Found matching players:\n{match_list}")
+            match_list = [
+                f"User {user['username']} (Interests: {', '.join(user['interests'])})" 
+                for user in matches
+            ]
+            await update.message.reply_text(_fit_message("Found matching players:", match_list))
         else:
             await update.message.reply_text("No matching players found at the moment.")
     else:
         await update.message.reply_text("Failed to save interests. Please try again.")
 
+async def _post_init(application):
+    """Open the database pool and OpenAI client once the event loop is running"""
+    # Fail startup on a missing OPENAI_API_KEY rather than on the first message
+    _get_client()
+    await init_db()
+
+async def _post_shutdown(application):
+    """Release database, Redis and OpenAI connections on shutdown"""
+    await close_db()
+    if _openai_client is not None:
+        await _openai_client.close()
+    if _redis is not None:
+        await _redis.aclose()
+
 def main():
     """Start the bot"""
     # Initialize application with ApplicationBuilder
-    application = ApplicationBuilder().token(os.getenv("TELEGRAM_TOKEN")).build()
+    application = (
+        ApplicationBuilder()
+        .token(os.getenv("TELEGRAM_TOKEN"))
+        .concurrent_updates(True)  # Database I/O no longer blocks, so handle updates in parallel
+        .post_init(_post_init)
+        .post_shutdown(_post_shutdown)
+        .build()
+    )
 
     # Add handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(MessageHandler(filters.TEXT, handle_message))
 
+    # psycopg's async connections need a selector event loop on Windows
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
     # Start polling
     application.run_polling()
 